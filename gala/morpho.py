@@ -107,6 +107,44 @@ imhmin = hminima
 
 remove_small_connected_components = skimage.morphology.remove_small_objects
 
+
+def remove_small_labels(labels, min_size=64):
+    """Remove labels smaller than `min_size` and relabel the rest from 1.
+
+    Unlike `remove_small_connected_components`, this function expects an
+    already-labeled image, and computes the result with a single label
+    count and a single lookup-table pass over the volume.
+
+    Parameters
+    ----------
+    labels : array of int
+        The input label image. Label 0 is treated as background.
+    min_size : int, optional
+        The smallest allowable label size, in voxels.
+
+    Returns
+    -------
+    out : array of int, same shape and type as `labels`
+        The label image with small labels set to 0, and the remaining
+        labels renumbered consecutively from 1.
+
+    Examples
+    --------
+    >>> image = np.array([[1, 1, 0, 4],
+    ...                   [1, 2, 0, 4],
+    ...                   [0, 0, 0, 4]])
+    >>> remove_small_labels(image, min_size=2)
+    array([[1, 1, 0, 2],
+           [1, 0, 0, 2],
+           [0, 0, 0, 2]])
+    """
+    counts = np.bincount(labels.ravel(), minlength=1)
+    keep = counts >= min_size
+    keep[0] = False
+    new_ids = (np.cumsum(keep) * keep).astype(labels.dtype)
+    return new_ids[labels]
+
+
 def regional_minima(a, connectivity=1):
     """Find the regional minima in an ndarray."""
     values = unique(a)
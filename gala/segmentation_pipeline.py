@@ -26,6 +26,14 @@ except ImportError:
 else:
     np_installed = True
 
+try:
+    import cupy
+    from cupyx.scipy import ndimage as cundimage
+except ImportError:
+    cupy_installed = False
+else:
+    cupy_installed = True
+
 try:
     import syngeo
 except ImportError:
@@ -48,6 +56,32 @@ def grab_boundary(prediction, channels, master_logger):
     return boundary
 
 
+def label_seeds(boundary, seed_val, master_logger):
+    """Returns ndarray labeling connected regions of boundary <= seed_val
+
+    The threshold is computed on the host. If CuPy is installed, the
+    boolean mask is labeled on the GPU, falling back to the CPU if no CUDA
+    device is available or the mask does not fit in device memory.
+
+    Args:
+        boundary:  ndarray.  The boundary probability map.
+        seed_val:  float.  The threshold at or below which voxels are seeds.
+
+    Returns:
+        An ndarray of int seed labels, with 0 as background.
+    """
+    seed_mask = boundary <= seed_val
+    if cupy_installed:
+        try:
+            cupy.cuda.runtime.getDeviceCount()
+            return cupy.asnumpy(cundimage.label(cupy.asarray(seed_mask))[0])
+        except (cupy.cuda.runtime.CUDARuntimeError,
+                cupy.cuda.memory.OutOfMemoryError) as e:
+            master_logger.warning("GPU seed labeling failed, using CPU: %s"
+                                  % str(e))
+    return label(seed_mask)[0]
+
+
 def gen_supervoxels(options, prediction_file, master_logger):
     """Returns ndarray labeled using (optionally seeded) watershed algorithm
 
@@ -82,11 +116,11 @@ def gen_supervoxels(options, prediction_file, master_logger):
     # imio.read_image_stack squeezes out the first dim.
 
     master_logger.debug("watershed seed value threshold: " + str(options.seed_val))
-    seeds = label(boundary<=options.seed_val)[0]
+    seeds = label_seeds(boundary, options.seed_val, master_logger)
 
     if options.seed_size > 0:
         master_logger.debug("Removing small seeds")
-        seeds = morpho.remove_small_connected_components(seeds, options.seed_size)
+        seeds = morpho.remove_small_labels(seeds, options.seed_size)
         master_logger.debug("Finished removing small seeds")
 
     master_logger.info("Starting watershed")
@@ -95,9 +129,8 @@ def gen_supervoxels(options, prediction_file, master_logger):
     seeds_cropped = seeds 
     if options.border_size > 0:
         boundary_cropped = boundary[options.border_size:(-1*options.border_size), options.border_size:(-1*options.border_size),options.border_size:(-1*options.border_size)]
-        seeds_cropped = label(boundary_cropped<=options.seed_val)[0]
-        if options.seed_size > 0:
-            seeds_cropped = morpho.remove_small_connected_components(seeds_cropped, options.seed_size)
+        # crop the existing seeds rather than relabeling the cropped volume
+        seeds_cropped = seeds[options.border_size:(-1*options.border_size), options.border_size:(-1*options.border_size),options.border_size:(-1*options.border_size)]
 
     # Returns a matrix labeled using seeded watershed
     watershed_mask = numpy.ones(boundary_cropped.shape).astype(numpy.uint8)
@@ -119,11 +152,8 @@ def gen_supervoxels(options, prediction_file, master_logger):
     
     supervoxels = supervoxels_cropped
     if options.border_size > 0:
-        supervoxels = seeds.copy()
-        supervoxels.dtype = supervoxels_cropped.dtype
-        supervoxels[:,:,:] = 0 
-        supervoxels[options.border_size:(-1*options.border_size), 
-                options.border_size:(-1*options.border_size),options.border_size:(-1*options.border_size)] = supervoxels_cropped
+        supervoxels = numpy.pad(supervoxels_cropped, options.border_size,
+                                mode='constant')
 
     master_logger.info("Finished watershed")
 
@@ -1,9 +1,47 @@
 import numpy as np
 from . import evaluate
-from skimage import color
 from matplotlib import cm, pyplot as plt
+from matplotlib.collections import LineCollection
 import itertools as it
-from math import ceil
+from math import ceil, sqrt
+
+# CIE XYZ coordinates of the D65 white point, and the matrix converting XYZ
+# to linear sRGB. These match the values used by `skimage.color.lab2rgb`.
+_XYZ_WHITE = np.array([0.95047, 1., 1.08883])
+_RGB_FROM_XYZ = np.linalg.inv(np.array([[0.412453, 0.357580, 0.180423],
+                                        [0.212671, 0.715160, 0.072169],
+                                        [0.019334, 0.119193, 0.950227]]))
+# XYZ -> linear sRGB for XYZ coordinates relative to the white point
+_RGB_FROM_XYZ_WHITE = _RGB_FROM_XYZ * _XYZ_WHITE
+
+# random number generator for segmentation color tables
+_COLOR_RNG = np.random.default_rng(0xC01092)
+
+
+def _lab2rgb(lab):
+    """Convert CIE Lab colors to (unclipped) sRGB.
+
+    Parameters
+    ----------
+    lab : np.ndarray of float, shape (N, 3)
+        The input colors.
+
+    Returns
+    -------
+    rgb : np.ndarray of float, shape (N, 3)
+        The colors in sRGB space. Values may fall outside of [0, 1].
+    """
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack((fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200), axis=1)
+    np.maximum(f[:, 2], 0, out=f[:, 2])
+    delta = 6 / 29
+    xyz_white = np.where(f > delta, f ** 3, 3 * delta ** 2 * (f - 4 / 29))
+    rgb = xyz_white @ _RGB_FROM_XYZ_WHITE.T.astype(lab.dtype)
+    linear = rgb <= 0.0031308
+    rgb[linear] *= 12.92
+    rgb[~linear] = 1.055 * rgb[~linear] ** (1 / 2.4) - 0.055
+    return rgb
+
 
 ###########################
 # VISUALIZATION FUNCTIONS #
@@ -45,15 +83,19 @@ def imshow_magma(im, axis=None):
     return axis.imshow(im, cmap='magma')
 
 
-def imshow_rand(im, axis=None, labrandom=True):
+def imshow_rand(im, axis=None, labrandom=True, seed=None):
     """Show a segmentation using a random colormap.
 
     Parameters
     ----------
     im : np.ndarray of int, shape (M, N)
-        The segmentation to be displayed.
+        The segmentation to be displayed. Float label images are
+        converted to int. Labels must be nonnegative.
     labrandom : bool, optional
         Use random points in the Lab colorspace instead of RGB.
+    seed : int, optional
+        Seed for the random colors. If not given, colors are drawn from a
+        module-level generator, and differ between calls.
 
     Returns
     -------
@@ -62,17 +104,30 @@ def imshow_rand(im, axis=None, labrandom=True):
     """
     if axis is None:
         fig, axis = plt.subplots()
-    rand_colors = np.random.random(size=(ceil(np.max(im)), 3))
+    im = np.asarray(im).astype(np.intp, copy=False)
+    if im.min() < 0:
+        raise ValueError('imshow_rand requires nonnegative labels.')
+    n_labels = int(im.max()) + 1
+    rng = _COLOR_RNG if seed is None else np.random.default_rng(seed)
+    rand_colors = rng.random((n_labels, 3), dtype=np.float32)
     if labrandom:
         rand_colors[:, 0] = rand_colors[:, 0] * 81 + 39
         rand_colors[:, 1] = rand_colors[:, 1] * 185 - 86
         rand_colors[:, 2] = rand_colors[:, 2] * 198 - 108
-        rand_colors = color.lab2rgb(rand_colors[np.newaxis, ...])[0]
-        rand_colors[rand_colors < 0] = 0
-        rand_colors[rand_colors > 1] = 1
-    rcmap = cm.colors.ListedColormap(np.concatenate((np.zeros((1, 3)),
-                                                     rand_colors)))
-    return axis.imshow(im, cmap=rcmap)
+        rand_colors = _lab2rgb(rand_colors)
+        np.clip(rand_colors, 0, 1, out=rand_colors)
+    rand_colors[0] = 0
+    # index the color table directly instead of going through a colormap
+    return axis.imshow(rand_colors[im], interpolation='nearest')
+
+
+_IMSHOW_FNS = {
+    'grey': imshow_grey,
+    'gray': imshow_grey,
+    'magma': imshow_magma,
+    'rand': imshow_rand,
+    'raw': lambda im, axis: axis.imshow(im),
+}
 
 
 def show_multiple_images(*images, axes=None, image_type='raw'):
@@ -88,29 +143,23 @@ def show_multiple_images(*images, axes=None, image_type='raw'):
     image_type : string, optional
         Displays the images with different colormaps. Set to display
         'raw' by default. Other options that are accepted
-        are 'grey' and 'magma', or 'rand'.
+        are 'grey' and 'magma', or 'rand'. Any other value raises a
+        ValueError.
 
     Returns
     -------
     fig : plt.Figure
         The image shown.
     """
+    imshow_fn = _IMSHOW_FNS.get(image_type)
+    if imshow_fn is None:
+        raise ValueError(f'not a valid image type: {image_type}')
     number_of_im = len(images)
     figure = plt.figure()
     for i in range(number_of_im):
         ax = (figure.add_subplot(1, number_of_im, i+1) if axes is None
               else axes[i])
-        if image_type == 'grey' or image_type == 'gray':
-            imshow_grey(images[i], axis=ax)
-        elif image_type == 'magma':
-            imshow_magma(images[i], axis=ax)
-        elif image_type == 'rand':
-            imshow_rand(images[i], axis=ax)
-        elif image_type == 'raw':
-            ax.imshow(images[i])
-        else:
-            print("not a valid image type.")
-            return None
+        imshow_fn(images[i], axis=ax)
         ax.set_title(f'Image number {i+1} with a {image_type} colormap.')
     return ax
 
@@ -143,17 +192,28 @@ def draw_seg(seg, im):
            [0.3, 0.9, 0.9, 0.5],
            [0.9, 0.9, 0.5, 0.5]])
     """
-    out = np.zeros_like(im)
-    labels = np.unique(seg)
-    if (seg==0).any():
-        labels = labels[1:]
-    for u in labels:
-        mask = (seg == u).nonzero()
-        color = im[mask].mean(axis=0)
-        out[mask] = color
+    labels, inverse = np.unique(seg, return_inverse=True)
+    inverse = inverse.ravel()
+    n_labels = len(labels)
+    # view `im` as (num_pixels, num_channels), with a single channel for
+    # images without a channel axis
+    im_flat = im.reshape((seg.size, -1))
+    counts = np.bincount(inverse, minlength=n_labels)
+    sums = np.stack([np.bincount(inverse, weights=im_flat[:, c],
+                                 minlength=n_labels)
+                     for c in range(im_flat.shape[1])], axis=1)
+    means = sums / counts[:, np.newaxis]
+    if labels[0] == 0:
+        means[0] = 0
+    out = means[inverse].reshape(im.shape).astype(im.dtype, copy=False)
     return out
 
 
+def _slice(a, axis, z):
+    """Return the view of slice `z` of `a` along `axis`."""
+    return a[(slice(None),) * (axis % a.ndim) + (z,)]
+
+
 def display_3d_segmentations(segs, image=None, probability_map=None, axis=0,
                              z=None, fignum=None):
     """Show slices of multiple 3D segmentations.
@@ -184,25 +244,25 @@ def display_3d_segmentations(segs, image=None, probability_map=None, axis=0,
         numplots += 1
     if probability_map is not None:
         numplots += 1
-    candidate_plot_arrangements = list(it.combinations_with_replacement(
-                                       range(1, 5), 2))
-    # get the smallest plot arrangement that can display the number of
-    # segmentations we want
-    plot_arrangement = [(i, j) for i, j in candidate_plot_arrangements
-                        if i * j >= numplots][0]
+    # smallest near-square grid that can display all the plots
+    ncols = ceil(sqrt(numplots))
+    nrows = ceil(numplots / ncols)
+    plot_arrangement = (nrows, ncols)
+    if z is None:
+        z = segs[0].shape[axis] // 2
     fig = plt.figure(fignum)
     current_subplot = 1
     if image is not None:
         plt.subplot(*plot_arrangement + (current_subplot,))
-        imshow_grey(np.rollaxis(image, axis)[z])
+        imshow_grey(_slice(image, axis, z))
         current_subplot += 1
     if probability_map is not None:
         plt.subplot(*plot_arrangement + (current_subplot,))
-        imshow_magma(np.rollaxis(probability_map, axis)[z])
+        imshow_magma(_slice(probability_map, axis, z))
         current_subplot += 1
     for i, j in enumerate(range(current_subplot, numplots + 1)):
         plt.subplot(*plot_arrangement + (j,))
-        imshow_rand(np.rollaxis(segs[i], axis)[z])
+        imshow_rand(_slice(segs[i], axis, z))
     return fig
 
 
@@ -230,10 +290,19 @@ def plot_vi(g, history, gt, fig=None):
     v = []
     n = []
     seg = g.get_segmentation()
-    for i in history:
-        seg[seg==i[1]] = i[0]
-        v.append(evaluate.vi(seg, gt))
-        n.append(len(np.unique(seg)-1))
+    # replay the merges on a map from labels to labels, rather than by
+    # rewriting every voxel of the segmentation at each step
+    seg_labels, inverse = np.unique(seg, return_inverse=True)
+    inverse = inverse.reshape(seg.shape)
+    history = np.asarray(history, dtype=seg_labels.dtype).reshape((-1, 2))
+    labels = np.union1d(seg_labels, history.ravel())
+    present = np.searchsorted(labels, seg_labels)
+    current = np.arange(len(labels))
+    for a, b in np.searchsorted(labels, history):
+        current[current == b] = a
+        relabel = labels[current[present]]
+        v.append(evaluate.vi(relabel[inverse], gt))
+        n.append(np.count_nonzero(np.unique(relabel)))
     if fig is None:
         fig = plt.figure()
     plt.plot(n, v, figure = fig)
@@ -241,8 +310,8 @@ def plot_vi(g, history, gt, fig=None):
     plt.ylabel('vi', figure = fig)
 
 
-def plot_vi_breakdown_panel(px, h, title, xlab, ylab, hlines, scatter_size,
-                            **kwargs):
+def plot_vi_breakdown_panel(px, h, title, xlab, ylab, hlines,
+                            scatter_size=None, **kwargs):
     """Plot a single panel (over or undersegmentation) of VI breakdown plot.
 
     Parameters
@@ -264,9 +333,12 @@ def plot_vi_breakdown_panel(px, h, title, xlab, ylab, hlines, scatter_size,
     -------
     None
     """
-    x = np.arange(max(min(px),1e-10), max(px), (max(px)-min(px))/100.0)
-    for val in hlines:
-        plt.plot(x, val/x, color='gray', ls=':', **kwargs)
+    if len(hlines) > 0:
+        x = np.linspace(max(min(px), 1e-10), max(px), 100)
+        ys = np.asarray(hlines)[:, np.newaxis] / x
+        segments = np.stack((np.broadcast_to(x, ys.shape), ys), axis=-1)
+        plt.gca().add_collection(LineCollection(segments, colors='gray',
+                                                linestyles=':'))
     plt.scatter(px, h, label=title, s=scatter_size, **kwargs)
     # Make points clickable to identify ID. This section needs work.
     plt.xlim(xmin=-0.05*max(px), xmax=1.05*max(px))
@@ -339,6 +411,33 @@ def plot_vi_breakdown(seg, gt, ignore_seg=[], ignore_gt=[],
         plt.ylim(-0.05*ymax, 1.05*ymax)
 
 
+def _scatter_points(points, colors, markers, **kwargs):
+    """Scatter 2D points, using a single `scatter` call where possible.
+
+    Parameters
+    ----------
+    points : np.ndarray of float, shape (K, 2)
+        The coordinates of the points to plot.
+    colors, markers : iterable
+        The color and marker of each point.
+    **kwargs : dict (string keys), optional
+        Keyword arguments to be passed through to
+        `matplotlib.pyplot.scatter`.
+
+    Returns
+    -------
+    points : list of `matplotlib.collections.PathCollection`
+        The points returned by the calls to `scatter`.
+    """
+    colors = [c for c, _ in zip(colors, points)]
+    markers = [m for m, _ in zip(markers, points)]
+    if len(points) > 0 and all(m == markers[0] for m in markers):
+        return [plt.scatter(points[:, 0], points[:, 1], c=colors,
+                            marker=markers[0], **kwargs)]
+    return [plt.scatter(x, y, c=c, marker=m, **kwargs)
+            for (x, y), c, m in zip(points, colors, markers)]
+
+
 def add_opts_to_plot(ars, colors='k', markers='^', **kwargs):
     """In an existing active split-vi plot, add the point of optimal VI.
 
@@ -364,7 +463,8 @@ def add_opts_to_plot(ars, colors='k', markers='^', **kwargs):
     Returns
     -------
     points : list of `matplotlib.collections.PathCollection`
-        The points returned by each of the calls to `scatter`.
+        The points returned by the calls to `scatter`. If all points
+        share a marker, they are drawn with a single call.
     """
     if type(colors) not in [list, tuple]:
         colors = [colors]
@@ -374,11 +474,13 @@ def add_opts_to_plot(ars, colors='k', markers='^', **kwargs):
         markers = [markers]
     if len(markers) < len(ars):
         markers = it.cycle(markers)
-    points = []
-    for ar, c, m in zip(ars, colors, markers):
-        opt = ar[:,ar.sum(axis=0).argmin()]
-        points.append(plt.scatter(opt[0], opt[1], c=c, marker=m, **kwargs))
-    return points
+    if len({ar.shape[1] for ar in ars}) == 1:
+        stacked = np.stack(ars)
+        best = stacked.sum(axis=1).argmin(axis=1)
+        opts = stacked[np.arange(len(ars)), :, best]
+    else:
+        opts = np.array([ar[:, ar.sum(axis=0).argmin()] for ar in ars])
+    return _scatter_points(opts, colors, markers, **kwargs)
 
 def add_nats_to_plot(ars, tss, stops=0.5, colors='k', markers='o', **kwargs):
     """In an existing active split-vi plot, add the natural stopping point.
@@ -393,12 +495,14 @@ def add_nats_to_plot(ars, tss, stops=0.5, colors='k', markers='o', **kwargs):
         holding the oversegmentation for each `i`.
     tss : list of numpy arrays
         Each array has shape (N,) and represents the algorithm
-        threshold that gave rise to the VI measurements in `ars`.
+        threshold that gave rise to the VI measurements in `ars`. The
+        thresholds must be sorted in increasing order.
     stops : float, optional
         The natural stopping point for the algorithm. For example, if
         an algorithm merges segments according to a merge probability,
         the natural stopping point is at $p=0.5$, when there are even
-        odds of the merge being a true merge.
+        odds of the merge being a true merge. Each curve must have at
+        least one threshold below its stopping point.
     colors : string, list of string, or list of float tuple, optional
         A color specification or list of color specifications. If there
         are fewer colors than split-VI arrays, the colors are cycled.
@@ -413,7 +517,8 @@ def add_nats_to_plot(ars, tss, stops=0.5, colors='k', markers='o', **kwargs):
     Returns
     -------
     points : list of `matplotlib.collections.PathCollection`
-        The points returned by each of the calls to `scatter`.
+        The points returned by the calls to `scatter`. If all points
+        share a marker, they are drawn with a single call.
     """
     if type(colors) not in [list, tuple]: colors = [colors]
     if len(colors) < len(ars): colors = it.cycle(colors)
@@ -421,11 +526,15 @@ def add_nats_to_plot(ars, tss, stops=0.5, colors='k', markers='o', **kwargs):
     if len(markers) < len(ars): markers = it.cycle(markers)
     if type(stops) not in [list, tuple]: stops = [stops]
     if len(stops) < len(ars): stops = it.cycle(stops)
-    points = []
-    for ar, ts, stop, c, m in zip(ars, tss, stops, colors, markers):
-        nat = ar[:,np.flatnonzero(ts<stop)[-1]]
-        points.append(plt.scatter(nat[0], nat[1], c=c, marker=m, **kwargs))
-    return points
+    nats = []
+    for ar, ts, stop in zip(ars, tss, stops):
+        # last threshold below `stop`, by binary search on the sorted `ts`
+        idx = np.searchsorted(ts, stop, side='left') - 1
+        if idx < 0:
+            raise ValueError(f'no threshold below stopping point {stop}')
+        nats.append(ar[:, idx])
+    nats = np.array(nats)
+    return _scatter_points(nats, colors, markers, **kwargs)
 
 def plot_split_vi(ars, best=None, colors='k', linespecs='-', **kwargs):
     """Make a split-VI plot.
@@ -506,11 +615,16 @@ def plot_decision_function(clf, data_range=None,
 
     data_range = np.array(data_range)
 
-    grid = np.linspace(*data_range, num=n_gridpoints, endpoint=True)
+    grid = np.linspace(*data_range, num=n_gridpoints, endpoint=True,
+                       dtype=np.float32)
     rr, cc = np.meshgrid(grid, grid, sparse=False)
-    feature_space = np.hstack((np.reshape(rr, (-1, 1)),
-                               np.reshape(cc, (-1, 1))))
-    prediction = clf.predict_proba(feature_space)[:, 1]  # Pr(class(X)=1)
+    feature_space = np.stack((rr.ravel(), cc.ravel()), axis=1)
+    # predict in chunks to keep the classifier's working set small
+    batch_size = 8192
+    prediction = np.concatenate([
+        clf.predict_proba(feature_space[i:i + batch_size])[:, 1]
+        for i in range(0, len(feature_space), batch_size)
+    ])  # Pr(class(X)=1)
     prediction = np.reshape(prediction, (n_gridpoints, n_gridpoints))
 
     fig, ax = plt.subplots()
@@ -518,9 +632,9 @@ def plot_decision_function(clf, data_range=None,
     ax.set_xticks([])
     ax.set_yticks([])
 
-    features = (features - data_range[0]) / (data_range[1] - data_range[0])
-
     if features is not None:
+        features = ((features - data_range[0]) /
+                    (data_range[1] - data_range[0]))
         if labels is not None:
             label_colors = cm.viridis(labels.astype(float) / np.max(labels))
         else:
@@ -0,0 +1,81 @@
+import logging
+import types
+
+import numpy as np
+from numpy.testing import assert_array_equal
+from scipy import ndimage as ndi
+
+from gala import segmentation_pipeline as pipeline
+
+
+class _CUDARuntimeError(RuntimeError):
+    pass
+
+
+class _OutOfMemoryError(MemoryError):
+    pass
+
+
+def _fake_cupy(device_count=None, asarray=None):
+    """Return a stand-in for the parts of CuPy used by `label_seeds`."""
+    runtime = types.SimpleNamespace(getDeviceCount=device_count,
+                                    CUDARuntimeError=_CUDARuntimeError)
+    memory = types.SimpleNamespace(OutOfMemoryError=_OutOfMemoryError)
+    return types.SimpleNamespace(
+        cuda=types.SimpleNamespace(runtime=runtime, memory=memory),
+        asarray=asarray, asnumpy=np.asarray)
+
+
+boundary = np.random.default_rng(0).random((6, 7, 8))
+seed_val = 0.3
+
+
+def test_label_seeds_cpu(monkeypatch):
+    monkeypatch.setattr(pipeline, 'cupy_installed', False)
+    seeds = pipeline.label_seeds(boundary, seed_val, logging.getLogger())
+    assert_array_equal(seeds, ndi.label(boundary <= seed_val)[0])
+
+
+def test_label_seeds_no_gpu_falls_back(monkeypatch, caplog):
+    def no_device():
+        raise _CUDARuntimeError('no CUDA-capable device is detected')
+    monkeypatch.setattr(pipeline, 'cupy_installed', True)
+    monkeypatch.setattr(pipeline, 'cupy', _fake_cupy(device_count=no_device),
+                        raising=False)
+    with caplog.at_level(logging.WARNING):
+        seeds = pipeline.label_seeds(boundary, seed_val,
+                                     logging.getLogger())
+    assert_array_equal(seeds, ndi.label(boundary <= seed_val)[0])
+    assert 'GPU seed labeling failed' in caplog.text
+
+
+def test_label_seeds_gpu_out_of_memory_falls_back(monkeypatch, caplog):
+    def out_of_memory(a):
+        raise _OutOfMemoryError('out of memory allocating mask')
+    monkeypatch.setattr(pipeline, 'cupy_installed', True)
+    monkeypatch.setattr(pipeline, 'cupy',
+                        _fake_cupy(device_count=lambda: 1,
+                                   asarray=out_of_memory),
+                        raising=False)
+    monkeypatch.setattr(pipeline, 'cundimage', ndi, raising=False)
+    with caplog.at_level(logging.WARNING):
+        seeds = pipeline.label_seeds(boundary, seed_val,
+                                     logging.getLogger())
+    assert_array_equal(seeds, ndi.label(boundary <= seed_val)[0])
+    assert 'GPU seed labeling failed' in caplog.text
+
+
+def test_label_seeds_gpu(monkeypatch):
+    transferred = []
+    def asarray(a):
+        transferred.append(a.dtype)
+        return a
+    monkeypatch.setattr(pipeline, 'cupy_installed', True)
+    monkeypatch.setattr(pipeline, 'cupy',
+                        _fake_cupy(device_count=lambda: 1, asarray=asarray),
+                        raising=False)
+    monkeypatch.setattr(pipeline, 'cundimage', ndi, raising=False)
+    seeds = pipeline.label_seeds(boundary, seed_val, logging.getLogger())
+    assert_array_equal(seeds, ndi.label(boundary <= seed_val)[0])
+    # only the boolean seed mask should be sent to the device
+    assert transferred == [np.bool_]
@@ -0,0 +1,100 @@
+import warnings
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+from skimage import color
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+import pytest
+
+from gala import viz
+
+
+def _random_lab(n, dtype):
+    # same sampling box as imshow_rand
+    lab = np.random.default_rng(0).random((n, 3), dtype=dtype)
+    lab[:, 0] = lab[:, 0] * 81 + 39
+    lab[:, 1] = lab[:, 1] * 185 - 86
+    lab[:, 2] = lab[:, 2] * 198 - 108
+    return lab
+
+
+def test_lab2rgb_matches_skimage():
+    for dtype, atol in [(np.float64, 1e-6), (np.float32, 5e-5)]:
+        lab = _random_lab(10000, dtype)
+        # colors outside the sampling box, with negative Z, exercise the
+        # Z clamping
+        lab = np.concatenate((lab, np.array([[0, 0, 100], [20, -40, 120],
+                                             [50, 60, 180]], dtype=dtype)))
+        with warnings.catch_warnings():
+            # skimage warns about colors with negative Z values, which it
+            # clamps, as does _lab2rgb
+            warnings.simplefilter('ignore')
+            expected = color.lab2rgb(lab.astype(np.float64)[np.newaxis])[0]
+        rgb = viz._lab2rgb(lab)
+        assert rgb.dtype == dtype
+        assert_allclose(np.clip(rgb, 0, 1), np.clip(expected, 0, 1),
+                        atol=atol)
+
+
+def test_slice_matches_rollaxis():
+    a = np.arange(24).reshape((2, 3, 4))
+    for axis in [0, 2, -1]:
+        assert_array_equal(viz._slice(a, axis, 1), np.rollaxis(a, axis)[1])
+
+
+def test_imshow_rand():
+    im = np.array([[0, 1, 1],
+                   [2, 2, 3]])
+    shown = viz.imshow_rand(im, seed=0).get_array()
+    plt.close('all')
+    assert shown.shape == im.shape + (3,)
+    assert_array_equal(shown[im == 0], 0)
+    assert np.all(shown[im != 0].sum(axis=-1) > 0)
+    assert_array_equal(shown[0, 1], shown[0, 2])
+
+
+def test_imshow_rand_seed():
+    im = np.array([[0, 1, 1],
+                   [2, 2, 3]])
+    shown0 = viz.imshow_rand(im, seed=5).get_array()
+    shown1 = viz.imshow_rand(im, seed=5).get_array()
+    plt.close('all')
+    assert_array_equal(shown0, shown1)
+
+
+def test_imshow_rand_float_labels():
+    im = np.array([[0, 1, 1],
+                   [2, 2, 3]])
+    shown = viz.imshow_rand(im, seed=0).get_array()
+    shown_float = viz.imshow_rand(im.astype(float), seed=0).get_array()
+    plt.close('all')
+    assert_array_equal(shown, shown_float)
+
+
+def test_imshow_rand_negative_labels():
+    with pytest.raises(ValueError):
+        viz.imshow_rand(np.array([[-1, 0], [1, 2]]))
+    plt.close('all')
+
+
+def test_add_nats_to_plot():
+    rng = np.random.default_rng(0)
+    ars = [rng.random((2, 11)) for _ in range(3)]
+    # the first thresholds include 0.5, which is not below a stop of 0.5
+    tss = [np.linspace(0, 1, 11), np.linspace(0.1, 0.9, 11),
+           np.sort(rng.random(11))]
+    stops = [0.5, 0.3, 1.0]
+    points = viz.add_nats_to_plot(ars, tss, stops)
+    plt.close('all')
+    expected = [ar[:, np.flatnonzero(ts < stop)[-1]]
+                for ar, ts, stop in zip(ars, tss, stops)]
+    assert_allclose(np.asarray(points[0].get_offsets()), expected)
+
+
+def test_add_nats_to_plot_no_threshold_below_stop():
+    ars = [np.random.random((2, 5))]
+    tss = [np.linspace(0.5, 1, 5)]
+    with pytest.raises(ValueError):
+        viz.add_nats_to_plot(ars, tss, stops=0.5)
+    plt.close('all')
@@ -86,6 +86,18 @@ def test_watershed_plateau_performance():
     assert_array_less(time_taken, 100, 'watershed plateau too slow')
 
 
+def test_remove_small_labels():
+    seeds = nd.label(probs[0] < 0.5)[0]
+    removed = morpho.remove_small_labels(seeds, 3)
+    expected = morpho.remove_small_connected_components(seeds, 3)
+    expected = morpho.relabel_sequential(expected)[0]
+    assert_array_equal(removed, expected)
+    background = np.zeros((3, 4), dtype=int)
+    assert_array_equal(morpho.remove_small_labels(background, 3), background)
+    empty = np.zeros((0, 4), dtype=int)
+    assert_array_equal(morpho.remove_small_labels(empty, 3), empty)
+
+
 if __name__ == '__main__':
     from numpy import testing
     testing.run_module_suite()